@@ -6,10 +6,12 @@ Cloudflare 官方 IPv4 → 每段 500 IP → 测速 → 取最快 20 个 → yxi
 
 import requests
 import ipaddress
-import subprocess
 import random
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from probe_record import CURL_TIMINGS, record_cidrs, run_curl
+from scoring import ProbeTable, top_n
+
 # ==================== 配置 ====================
 IPV4_URL = "https://www.cloudflare.com/ips-v4"
 OUTPUT_FILE = "yxip.txt"
@@ -24,7 +26,9 @@ def get_ipv4_cidrs():
     try:
         r = requests.get(IPV4_URL, timeout=10)
         r.raise_for_status()
-        return [line.strip() for line in r.text.strip().split('\n') if line.strip()]
+        cidrs = [line.strip() for line in r.text.strip().split('\n') if line.strip()]
+        record_cidrs(cidrs)
+        return cidrs
     except Exception as e:
         print(f"获取 CIDR 失败: {e}")
         return []
@@ -54,17 +58,15 @@ def keep_alive():
     except Exception as e:
         print(f"错误: {e}")
         
+def test_ip_timings(ip):
+    """测速：返回 (建连, 首字节, 总耗时) ms，失败返回 None"""
+    cmd = ['curl', '-s', '-o', '/dev/null', '-w', CURL_TIMINGS, '--max-time', str(TIMEOUT), f"http://{ip}"]
+    return run_curl(cmd, ip, "http", TIMEOUT + 2)
+
 def test_ip(ip):
     """测速：返回 (延迟ms, IP) 或 (inf, ip)"""
-    cmd = ['curl', '-s', '-o', '/dev/null', '-w', '%{time_total}', '--max-time', str(TIMEOUT), f"http://{ip}"]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=TIMEOUT + 2)
-        if result.returncode == 0:
-            latency = round(float(result.stdout.strip()) * 1000, 2)
-            return latency, ip
-        return float('inf'), ip
-    except:
-        return float('inf'), ip
+    timings = test_ip_timings(ip)
+    return (timings[-1] if timings else float('inf')), ip
 
 def main():
     print("正在获取 Cloudflare 官方 IPv4 CIDR...")
@@ -86,20 +88,19 @@ def main():
         return
 
     print(f"\n总计 {len(all_ips)} 个 IPv4，开始测速（并发 {MAX_WORKERS}）...")
-    results = []
+    results = ProbeTable(len(all_ips))
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
         futures = {pool.submit(test_ip, ip): ip for ip in all_ips}
         for future in as_completed(futures):
             lat, ip = future.result()
+            results.add(ip, lat)
             if lat != float('inf'):
-                results.append((lat, ip))
                 print(f"  {ip} → {lat} ms")
             else:
                 print(f"  {ip} → 超时")
 
-    # 按延迟排序，取前 TOP_N
-    results.sort()
-    best_20 = results[:TOP_N]
+    # 按综合分数（默认即延迟）取前 TOP_N
+    best_20 = top_n(results, TOP_N)
 
     # 写入文件（纯 IP）
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
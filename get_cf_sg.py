@@ -10,6 +10,9 @@ import subprocess
 import random
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from probe_record import CURL_TIMINGS, proxy_target, record, record_cidrs, run_curl
+from scoring import ProbeTable, top_n, top_n_by_region
+
 # ==================== 配置 ====================
 IPV4_URL = "https://www.cloudflare.com/ips-v4"
 TIMEOUT = 6
@@ -168,23 +171,23 @@ def select_fastest_alive_443_ip():
 
     print(f"\n📡 alive.txt 发现 {len(ips)} 个 443 IP，开始测速...")
 
-    results = []
+    results = ProbeTable(len(ips))
     with ThreadPoolExecutor(max_workers=ALIVE_MAX_WORKERS) as pool:
         futures = [pool.submit(test_alive_ip_443, ip) for ip in ips]
         for f in as_completed(futures):
             lat, ip = f.result()
+            results.add(ip, lat)
             if lat != float("inf"):
-                results.append((lat, ip))
                 print(f"  {ip} → {lat} ms")
             else:
                 print(f"  {ip} → 超时")
 
-    if not results:
+    ranked = top_n(results, 1)
+    if not ranked:
         print("❌ 所有 443 IP 测试失败")
         return None
 
-    results.sort()
-    best = results[0]
+    best = ranked[0]
     print(f"🏆 alive.txt 最快 IP: {best[1]} → {best[0]} ms")
     return best[1]
 
@@ -216,9 +219,13 @@ def update_proxyipmy_from_alive():
     print(f"📡 检测 {len(sg_ips)} 个 SG 443 IP 可用性...")
     for ip in sg_ips:
         check_url = f"https://checkproxyip.918181.xyz/check?proxyip={ip}"
+        start = time.perf_counter()
         try:
             r = requests.get(check_url, timeout=5)
-            if r.status_code == 200 and "success" in r.text.lower():
+            ok = r.status_code == 200 and "success" in r.text.lower()
+            elapsed = round((time.perf_counter() - start) * 1000, 2)
+            record(ip, proxy_target("SG"), "ok" if ok else "fail", timings=(None, None, elapsed))
+            if ok:
                 print(f"✅ 第一个可用 SG IP: {ip} → 更新 proxyipmy.dns.army")
                 # 更新 dynv6
                 url = "http://dynv6.com/api/update"
@@ -240,6 +247,7 @@ def update_proxyipmy_from_alive():
             else:
                 print(f"❌ IP 不可用: {ip}")
         except Exception as e:
+            record(ip, proxy_target("SG"), "timeout" if isinstance(e, requests.Timeout) else "fail")
             print(f"⚠️ 检测异常: {ip} | {e}")
 
     print("❌ 未找到可用 SG IP，跳过更新")
@@ -268,7 +276,9 @@ def get_ipv4_cidrs():
     try:
         r = requests.get(IPV4_URL, timeout=10)
         r.raise_for_status()
-        return [line.strip() for line in r.text.strip().split('\n') if line.strip()]
+        cidrs = [line.strip() for line in r.text.strip().split('\n') if line.strip()]
+        record_cidrs(cidrs)
+        return cidrs
     except Exception as e:
         print(f"获取 CIDR 失败: {e}")
         return []
@@ -286,21 +296,20 @@ def expand_cidr_random(cidr, count=IPS_PER_CIDR):
     except:
         return []
 
-def test_ip_geo(ip, host):
-    """测速指定节点"""
+def test_ip_geo_timings(ip, host):
+    """测速指定节点：返回 (建连, 首字节, 总耗时) ms，失败返回 None"""
     cmd = [
-        'curl', '-s', '-o', '/dev/null', '-w', '%{time_total}',
+        'curl', '-s', '-o', '/dev/null', '-w', CURL_TIMINGS,
         '--max-time', str(TIMEOUT),
         '--resolve', f"{host}:80:{ip}",
         f"http://{host}"
     ]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=TIMEOUT + 2)
-        if result.returncode == 0:
-            return round(float(result.stdout.strip()) * 1000, 2), ip
-        return float('inf'), ip
-    except:
-        return float('inf'), ip
+    return run_curl(cmd, ip, f"geo:{host}", TIMEOUT + 2)
+
+def test_ip_geo(ip, host):
+    """测速指定节点"""
+    timings = test_ip_geo_timings(ip, host)
+    return (timings[-1] if timings else float('inf')), ip
 
 def main():
     print("正在获取 Cloudflare 官方 IPv4 CIDR...")
@@ -323,7 +332,7 @@ def main():
         return
 
     # 为每个地区测速
-    results = {geo: [] for geo in TEST_POINTS}
+    results = ProbeTable(len(all_ips) * len(TEST_POINTS))
     for geo, info in TEST_POINTS.items():
         host = info['host']
         location = info['location']
@@ -332,17 +341,15 @@ def main():
             futures = {pool.submit(test_ip_geo, ip, host): ip for ip in all_ips}
             for future in as_completed(futures):
                 lat, ip = future.result()
+                results.add(ip, lat, region=geo)
                 if lat != float('inf'):
-                    results[geo].append((lat, ip))
                     print(f"  {ip} → {lat} ms ({location})")
                 else:
                     print(f"  {ip} → 超时")
 
-    # 排序并取前 TOP_N
-    best = {}
-    for geo in TEST_POINTS:
-        results[geo].sort()
-        best[geo] = results[geo][:TOP_N]
+    # 按综合分数（默认即延迟）每个地区取前 TOP_N
+    ranked = top_n_by_region(results, TOP_N)
+    best = {geo: ranked.get(geo, []) for geo in TEST_POINTS}
 
     # 写入文件
     for geo, data in best.items():
@@ -0,0 +1,605 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统一流水线：一次运行同时产出 ip.txt / yxip.txt / 各区域文件
+
+阶段：fetch_sources → fetch_cidrs → sample → prefilter → probe → classify → rank → publish
+- CIDR 列表、alive.txt 只下载一次
+- 每个 CIDR 只抽样一次，各任务取样本前缀（随机样本的前缀仍是随机样本）
+- 同一 IP 对同一目标只探测一次（如 HK/JP 共用测速节点），trace 一次归类到所有区域
+- prefilter 用纯 HTTP 测速剔除不通的 IP，后续探测只跑存活 IP
+
+PIPELINE 为声明式配置，默认复现 workflow 中 collect_ips.py + youxuan.py 的行为，
+并附带 collect_ipsyx.py（yxip.txt）；get_cf_sg.py 的测速区域任务默认关闭，
+因为它和 youxuan.py 写同一批区域文件、更新同一批 dynv6 域名（两者同时开启会报错）。
+可用 --config 传入 JSON 覆盖任意配置项；regions / dynv6 整体替换而不是逐项合并，
+这样才能去掉某个区域。
+
+--record FILE 把每次探测追加录制到 FILE；--replay FILE 不走网络，
+用录制结果重跑 sample → rank → publish（结果写到 --out 目录，不更新 dynv6），
+便于离线对比不同抽样数和评分权重。探测结果里的建连 / 首字节耗时会作为
+connect / ttfb 信号进入评分表，回放时调整这些权重会改变排序。
+"""
+
+import argparse
+import bisect
+import copy
+import ipaddress
+import json
+import os
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+import collect_ips
+import collect_ipsyx
+import get_cf_sg
+import probe_record
+import youxuan
+from scoring import ProbeTable, top_n, top_n_by_region
+
+# ==================== 配置 ====================
+PIPELINE = {
+    "seed": None,
+    "max_workers": 150,
+    # 原 workflow 不做保活，默认关闭
+    "keep_alive": False,
+    # 用纯 HTTP 测速预筛，后续探测只跑存活 IP
+    "prefilter": True,
+    "cidr_url": collect_ipsyx.IPV4_URL,
+    "sources": {
+        "enabled": True,
+        "urls": collect_ips.urls,
+        "output": "ip.txt",
+    },
+    "jobs": {
+        # collect_ipsyx.py：纯 HTTP 测速 → yxip.txt
+        "yxip": {
+            "enabled": True,
+            "probe": "http",
+            "per_cidr": collect_ipsyx.IPS_PER_CIDR,
+            "top_n": collect_ipsyx.TOP_N,
+            "weights": {},
+            "output": collect_ipsyx.OUTPUT_FILE,
+        },
+        # youxuan.py：cdn-cgi/trace colo 归类 → SG.txt / US.txt / JP.txt
+        "regions_trace": {
+            "enabled": True,
+            "probe": "trace",
+            "per_cidr": youxuan.IPS_PER_CIDR,
+            "top_n": youxuan.TOP_N,
+            "weights": {},
+            "regions": {region: sorted(colos) for region, colos in youxuan.COLO_MAP.items()},
+            "dynv6": youxuan.DYNV6,
+            "output": "{region}.txt",
+        },
+        # get_cf_sg.py：指定节点测速 → SG.txt / US.txt / HK.txt / JP.txt
+        "regions_geo": {
+            "enabled": False,
+            "probe": "geo",
+            "per_cidr": get_cf_sg.IPS_PER_CIDR,
+            "top_n": get_cf_sg.TOP_N,
+            "weights": {},
+            "regions": {geo: info["host"] for geo, info in get_cf_sg.TEST_POINTS.items()},
+            "dynv6": {
+                "SG": (get_cf_sg.DYNV6_HOSTNAME, get_cf_sg.DYNV6_TOKEN),
+                "US": (get_cf_sg.DYNV6_USHOSTNAME, get_cf_sg.DYNV6_USTOKEN),
+                "JP": (get_cf_sg.DYNV6_JPHOSTNAME, get_cf_sg.DYNV6_JPTOKEN),
+            },
+            "output": "{region}.txt",
+        },
+    },
+    # alive.txt 反代：第一个检测通过的 IP 更新到 dynv6
+    "proxy": {
+        "enabled": True,
+        "alive_url": youxuan.ALIVE_TXT_URL,
+        "check_api": youxuan.CHECK_PROXY_API,
+        "country": "US",
+        "timeout": 6,
+        "hostname": youxuan.PROXY_HOSTNAME,
+        "token": youxuan.PROXY_TOKEN,
+    },
+}
+# ==============================================
+
+
+# 这些配置项整体替换，不递归合并（否则 --config 无法去掉区域或 dynv6 域名）
+REPLACE_KEYS = {"regions", "dynv6"}
+
+
+def merge_config(base, override):
+    """递归合并配置，override 中的值覆盖 base；REPLACE_KEYS 中的项整体替换"""
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if key in REPLACE_KEYS:
+            merged[key] = copy.deepcopy(value)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def enabled_jobs(cfg):
+    return {name: job for name, job in cfg["jobs"].items() if job.get("enabled")}
+
+
+def job_outputs(job):
+    """任务写出的文件：{区域或 None: 文件名}"""
+    if "regions" in job:
+        return {region: job["output"].format(region=region) for region in job["regions"]}
+    return {None: job["output"]}
+
+
+def validate_config(cfg):
+    """开启的任务之间不能写同一个文件，也不能更新同一个 dynv6 域名"""
+    outputs = {}
+    if cfg["sources"]["enabled"]:
+        outputs[cfg["sources"]["output"]] = "sources"
+    hostnames = {}
+    if cfg["proxy"]["enabled"]:
+        hostnames[cfg["proxy"]["hostname"]] = "proxy"
+    for name, job in enabled_jobs(cfg).items():
+        for path in job_outputs(job).values():
+            if path in outputs:
+                raise ValueError(f"任务 {name} 与 {outputs[path]} 都写 {path}")
+            outputs[path] = name
+        for region, (hostname, _) in job.get("dynv6", {}).items():
+            if region not in job["regions"]:
+                continue
+            if hostname in hostnames:
+                raise ValueError(f"任务 {name} 与 {hostnames[hostname]} 都更新 dynv6 {hostname}")
+            hostnames[hostname] = name
+
+
+# ---------- 探测函数：统一返回 ProbeResult ----------
+ProbeResult = namedtuple("ProbeResult", "latency colo connect ttfb")
+# 没有探测结果的 IP 视为超时
+MISSING = ProbeResult(float("inf"), None, float("nan"), float("nan"))
+
+
+def _nan(value):
+    return float("nan") if value is None else value
+
+
+def from_timings(timings, colo=None):
+    """(connect, ttfb, total) → ProbeResult；timings 为 None 表示失败"""
+    if not timings:
+        return MISSING
+    connect, ttfb, total = timings
+    return ProbeResult(total, colo, _nan(connect), _nan(ttfb))
+
+
+def probe_http(ip):
+    return from_timings(collect_ipsyx.test_ip_timings(ip))
+
+
+def probe_geo(ip, host):
+    return from_timings(get_cf_sg.test_ip_geo_timings(ip, host))
+
+
+def probe_trace(ip):
+    start = time.perf_counter()
+    _, colo = youxuan.trace_ip(ip)
+    if not colo:
+        return MISSING
+    return from_timings((None, None, round((time.perf_counter() - start) * 1000, 2)), colo)
+
+
+def check_proxy(ip, cfg):
+    target = probe_record.proxy_target(cfg["country"])
+    start = time.perf_counter()
+    try:
+        chk = requests.get(cfg["check_api"] + ip, timeout=cfg["timeout"])
+        ok = chk.status_code == 200 and "success" in chk.text.lower()
+    except Exception as e:
+        probe_record.record(ip, target, "timeout" if isinstance(e, requests.Timeout) else "fail")
+        return False
+    elapsed = round((time.perf_counter() - start) * 1000, 2)
+    probe_record.record(ip, target, "ok" if ok else "fail", timings=(None, None, elapsed))
+    return ok
+
+
+def job_targets(job):
+    """任务依赖的探测目标"""
+    if job["probe"] == "geo":
+        return list(dict.fromkeys(f"geo:{host}" for host in job["regions"].values()))
+    return [job["probe"]]
+
+
+def probe_targets(cfg):
+    """列出本次运行需要的探测目标（已去重）"""
+    targets = []
+    if cfg["prefilter"] or any(j["probe"] == "http" for j in enabled_jobs(cfg).values()):
+        targets.append("http")
+    for job in enabled_jobs(cfg).values():
+        for target in job_targets(job):
+            if target not in targets:
+                targets.append(target)
+    return targets
+
+
+def run_probe(target, ip):
+    if target == "http":
+        return probe_http(ip)
+    if target == "trace":
+        return probe_trace(ip)
+    if target.startswith("geo:"):
+        return probe_geo(ip, target[len("geo:"):])
+    raise ValueError(f"未知探测目标: {target}")
+
+
+def probe_many(ctx, target, ips):
+    """并发探测一批 IP，结果写入 ctx["probes"][target]"""
+    results = ctx["probes"].setdefault(target, {})
+    todo = [ip for ip in ips if ip not in results]
+    if not todo:
+        return results
+    if ctx["replay"]:
+        # 回放：没录到的 IP 视为超时
+        events = ctx["replay"].events(target)
+        for ip in todo:
+            event = events.get(ip)
+            if event is None:
+                results[ip] = MISSING
+            else:
+                results[ip] = ProbeResult(
+                    probe_record.event_latency(event), event.colo, _nan(event.connect), _nan(event.ttfb)
+                )
+        return results
+    print(f"\n🔍 探测 {target}：{len(todo)} 个 IP（并发 {ctx['config']['max_workers']}）...")
+    with ThreadPoolExecutor(max_workers=ctx["config"]["max_workers"]) as pool:
+        futures = {pool.submit(run_probe, target, ip): ip for ip in todo}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    ok = sum(1 for ip in todo if results[ip][0] != float("inf"))
+    print(f"  {target} 完成：{ok}/{len(todo)} 可用")
+    return results
+
+
+def sample_cidr(cidr, count, rng):
+    """从 CIDR 随机取 count 个主机 IP（按下标抽样，不展开整段）"""
+    try:
+        net = ipaddress.ip_network(cidr, strict=False)
+    except ValueError:
+        return []
+    if net.num_addresses <= 2:
+        return []
+    first = int(net.network_address) + 1
+    hosts = net.num_addresses - 2
+    return [str(ipaddress.IPv4Address(first + i)) for i in rng.sample(range(hosts), min(count, hosts))]
+
+
+def sample_recorded(cidr, count, rng, recorded):
+    """回放：只在录制过的 IP 中按段抽样（recorded 为已排序的 IP 整数列表）"""
+    try:
+        net = ipaddress.ip_network(cidr, strict=False)
+    except ValueError:
+        return []
+    lo = bisect.bisect_left(recorded, int(net.network_address))
+    hi = bisect.bisect_right(recorded, int(net.broadcast_address))
+    population = recorded[lo:hi]
+    return [str(ipaddress.IPv4Address(ip)) for ip in rng.sample(population, min(count, len(population)))]
+
+
+def recorded_cidrs(ips):
+    """录制里没有 CIDR（旧文件）时，把录制过的 IP 按 /16 分段"""
+    nets = {ipaddress.ip_network(f"{ip}/16", strict=False) for ip in ips}
+    return [str(net) for net in sorted(nets)]
+
+
+# ---------- 阶段 ----------
+def stage_fetch_sources(ctx):
+    cfg = ctx["config"]
+    if ctx["replay"]:
+        return
+    if cfg["keep_alive"]:
+        get_cf_sg.keep_alive()
+
+    if cfg["sources"]["enabled"]:
+        urls = cfg["sources"]["urls"]
+        print(f"📥 并发抓取 {len(urls)} 个 IP 来源...")
+        unique_ips = set()
+        with ThreadPoolExecutor(max_workers=len(urls) or 1) as pool:
+            for ips in pool.map(collect_ips.fetch_url_ips, urls):
+                unique_ips.update(ips)
+        ctx["source_ips"] = unique_ips
+
+    if cfg["proxy"]["enabled"]:
+        try:
+            r = requests.get(cfg["proxy"]["alive_url"], timeout=10)
+            r.raise_for_status()
+            ctx["alive_lines"] = r.text.splitlines()
+        except Exception as e:
+            print(f"❌ 读取 alive.txt 失败: {e}")
+
+
+def stage_fetch_cidrs(ctx):
+    if not enabled_jobs(ctx["config"]):
+        return
+    if ctx["replay"]:
+        ctx["cidrs"] = list(ctx["replay"].cidrs)
+        if not ctx["cidrs"]:
+            ctx["cidrs"] = recorded_cidrs(ctx["replay"].ips())
+            print("⚠️ 录制中没有 CIDR，按 /16 对录制过的 IP 分段")
+        if not ctx["cidrs"]:
+            raise ValueError("录制中没有任何 Cloudflare IP 探测结果，无法回放")
+        print(f"共 {len(ctx['cidrs'])} 个 CIDR（回放）")
+        return
+    try:
+        r = requests.get(ctx["config"]["cidr_url"], timeout=10)
+        r.raise_for_status()
+        ctx["cidrs"] = [line.strip() for line in r.text.splitlines() if line.strip()]
+        probe_record.record_cidrs(ctx["cidrs"])
+    except Exception as e:
+        print(f"获取 CIDR 失败: {e}")
+    print(f"共 {len(ctx['cidrs'])} 个 CIDR")
+
+
+def stage_sample(ctx):
+    jobs = enabled_jobs(ctx["config"])
+    if not jobs or not ctx["cidrs"]:
+        return
+    pool_size = max(job["per_cidr"] for job in jobs.values())
+    rng = ctx["rng"]
+    samples = {}
+    if ctx["replay"]:
+        recorded = sorted(int(ipaddress.IPv4Address(ip)) for ip in ctx["replay"].ips())
+        for cidr in ctx["cidrs"]:
+            samples[cidr] = sample_recorded(cidr, pool_size, rng, recorded)
+    else:
+        for cidr in ctx["cidrs"]:
+            samples[cidr] = sample_cidr(cidr, pool_size, rng)
+
+    for name, job in jobs.items():
+        ips = []
+        for cidr in ctx["cidrs"]:
+            ips.extend(samples[cidr][:job["per_cidr"]])
+        ctx["candidates"][name] = ips
+
+    ctx["pool"] = list(dict.fromkeys(ip for ips in samples.values() for ip in ips))
+    print(f"抽样完成：共享 IP 池 {len(ctx['pool'])} 个（每段最多 {pool_size} 个）")
+
+
+def stage_prefilter(ctx):
+    cfg = ctx["config"]
+    if not ctx["pool"]:
+        return
+    if not cfg["prefilter"]:
+        ctx["alive"] = set(ctx["pool"])
+        return
+    if ctx["replay"] and not ctx["replay"].events("http"):
+        # 单独脚本（youxuan.py / get_cf_sg.py）录的文件没有 http 探测，预筛直接放行
+        print("⚠️ 录制中没有 http 探测，跳过预筛")
+        ctx["alive"] = set(ctx["pool"])
+        return
+    http = probe_many(ctx, "http", ctx["pool"])
+    ctx["alive"] = {ip for ip, result in http.items() if result.latency != float("inf")}
+    print(f"预筛完成：{len(ctx['alive'])}/{len(ctx['pool'])} 个 IP 存活")
+
+
+def stage_probe(ctx):
+    for target in probe_targets(ctx["config"]):
+        if target == "http" and ctx["config"]["prefilter"]:
+            ips = ctx["pool"]
+        elif target == "http":
+            # 不预筛时只测 http 任务自己的候选
+            ips = list(dict.fromkeys(
+                ip
+                for name, job in enabled_jobs(ctx["config"]).items()
+                if job["probe"] == "http"
+                for ip in ctx["candidates"].get(name, [])
+            ))
+        else:
+            ips = [ip for ip in ctx["pool"] if ip in ctx["alive"]]
+        probe_many(ctx, target, ips)
+
+    proxy = ctx["config"]["proxy"]
+    if not proxy["enabled"]:
+        return
+    print(f"\n📡 检测 alive.txt 中 {proxy['country']} 443 反代 IP...")
+    if ctx["replay"]:
+        # 回放：取最近一次运行中该国家第一个检测通过的 IP
+        target = probe_record.proxy_target(proxy["country"])
+        for event in ctx["replay"].last_run_events(target):
+            ctx["probes"].setdefault("checkproxy", {})[event.ip] = event.status == "ok"
+            if event.status == "ok":
+                ctx["proxy_ip"] = event.ip
+                return
+        return
+    for line in ctx["alive_lines"]:
+        parts = [p.strip() for p in line.split(",")]
+        if len(parts) < 3 or parts[1] != "443" or parts[2].upper() != proxy["country"]:
+            continue
+        ok = check_proxy(parts[0], proxy)
+        ctx["probes"].setdefault("checkproxy", {})[parts[0]] = ok
+        if ok:
+            ctx["proxy_ip"] = parts[0]
+            return
+
+
+def _signals(results, ips):
+    rows = [results.get(ip, MISSING) for ip in ips]
+    return {
+        "latency": [r.latency for r in rows],
+        "connect": [r.connect for r in rows],
+        "ttfb": [r.ttfb for r in rows],
+    }
+
+
+def stage_classify(ctx):
+    """把探测结果按任务整理成 ProbeTable"""
+    for name, job in enabled_jobs(ctx["config"]).items():
+        candidates = ctx["candidates"].get(name, [])
+        table = ProbeTable(len(candidates))
+        if job["probe"] == "http":
+            table.add_many(candidates, **_signals(ctx["probes"].get("http", {}), candidates))
+        elif job["probe"] == "trace":
+            trace = ctx["probes"].get("trace", {})
+            by_region = {region: [] for region in job["regions"]}
+            for ip in candidates:
+                colo = trace.get(ip, MISSING).colo
+                if not colo:
+                    continue
+                for region, colos in job["regions"].items():
+                    if any(colo.startswith(c) for c in colos):
+                        by_region[region].append(ip)
+            for region, ips in by_region.items():
+                table.add_many(ips, region=region, **_signals(trace, ips))
+        elif job["probe"] == "geo":
+            for region, host in job["regions"].items():
+                geo = ctx["probes"].get(f"geo:{host}", {})
+                table.add_many(candidates, region=region, **_signals(geo, candidates))
+        else:
+            raise ValueError(f"未知探测类型: {job['probe']}")
+        ctx["tables"][name] = table
+
+
+def stage_rank(ctx):
+    for name, job in enabled_jobs(ctx["config"]).items():
+        table = ctx["tables"][name]
+        if "regions" in job:
+            ranked = top_n_by_region(table, job["top_n"], job["weights"])
+            ctx["ranked"][name] = {region: ranked.get(region, []) for region in job["regions"]}
+        else:
+            ctx["ranked"][name] = top_n(table, job["top_n"], job["weights"])
+
+
+def output_path(ctx, name):
+    return os.path.join(ctx["out_dir"], name)
+
+
+def write_ips(path, pairs):
+    with open(path, "w", encoding="utf-8") as f:
+        for _, ip in pairs:
+            f.write(ip + "\n")
+
+
+def stage_publish(ctx):
+    cfg = ctx["config"]
+    replay = ctx["replay"] is not None
+    os.makedirs(ctx["out_dir"], exist_ok=True)
+    if cfg["sources"]["enabled"] and not replay:
+        collect_ips.save_ips(ctx["source_ips"], output_path(ctx, cfg["sources"]["output"]))
+
+    for name, job in enabled_jobs(cfg).items():
+        ranked = ctx["ranked"].get(name)
+        if ranked is None:
+            continue
+        if replay and not any(ctx["replay"].events(t) for t in job_targets(job)):
+            print(f"⚠️ 录制中没有 {name} 需要的探测（{', '.join(job_targets(job))}），跳过")
+            continue
+        outputs = job_outputs(job)
+        if "regions" not in job:
+            path = output_path(ctx, outputs[None])
+            write_ips(path, ranked)
+            print(f"\n{name}：最快 {len(ranked)} 个已写入 → {path}")
+            continue
+        for region, pairs in ranked.items():
+            path = output_path(ctx, outputs[region])
+            write_ips(path, pairs)
+            print(f"\n{name}：{region} 最快 {len(pairs)} 个已写入 → {path}")
+            if not pairs:
+                print(f"⚠️ {region} 未命中任何 IP")
+            elif region in job.get("dynv6", {}):
+                if replay:
+                    print(f"🔁 回放：{job['dynv6'][region][0]} → {pairs[0][1]}（不更新 dynv6）")
+                else:
+                    youxuan.dynv6_update(*job["dynv6"][region], pairs[0][1])
+
+    proxy = cfg["proxy"]
+    if proxy["enabled"]:
+        if ctx["proxy_ip"] and replay:
+            print(f"🔁 回放：{proxy['hostname']} → {ctx['proxy_ip']}（不更新 dynv6）")
+        elif ctx["proxy_ip"]:
+            youxuan.dynv6_update(proxy["hostname"], proxy["token"], ctx["proxy_ip"])
+            print(f"🏁 {proxy['hostname']} 完成")
+        else:
+            print(f"❌ alive.txt 中未找到可用 {proxy['country']} 反代 IP")
+
+
+STAGES = [
+    ("fetch_sources", stage_fetch_sources),
+    ("fetch_cidrs", stage_fetch_cidrs),
+    ("sample", stage_sample),
+    ("prefilter", stage_prefilter),
+    ("probe", stage_probe),
+    ("classify", stage_classify),
+    ("rank", stage_rank),
+    ("publish", stage_publish),
+]
+
+
+def new_context(config, replay=None, out_dir="."):
+    return {
+        "config": config,
+        "replay": replay,
+        "out_dir": out_dir,
+        "rng": random.Random(config["seed"]),
+        "source_ips": set(),
+        "alive_lines": [],
+        "cidrs": [],
+        "pool": [],
+        "candidates": {},
+        "alive": set(),
+        "probes": {},
+        "proxy_ip": None,
+        "tables": {},
+        "ranked": {},
+    }
+
+
+def run(config=None, replay=None, out_dir="."):
+    config = config or PIPELINE
+    validate_config(config)
+    ctx = new_context(config, replay, out_dir)
+    for name, stage in STAGES:
+        start = time.perf_counter()
+        print(f"\n===== {name} =====")
+        stage(ctx)
+        print(f"----- {name} 用时 {time.perf_counter() - start:.1f}s")
+    return ctx
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cloudflare 优选 IP 统一流水线")
+    parser.add_argument("--config", help="JSON 配置文件，覆盖 PIPELINE 中的对应项")
+    parser.add_argument("--seed", type=int, help="抽样随机种子")
+    parser.add_argument("--record", help="把每次探测追加录制到该文件（.gz 结尾则压缩）")
+    parser.add_argument("--replay", help="用录制文件代替网络探测")
+    parser.add_argument("--out", help="输出目录（回放默认 replay_out，否则当前目录）")
+    args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error("--record 和 --replay 不能同时使用")
+
+    config = PIPELINE
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = merge_config(config, json.load(f))
+    if args.seed is not None:
+        config = merge_config(config, {"seed": args.seed})
+    try:
+        validate_config(config)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.replay:
+        recording = probe_record.load(args.replay)
+        if not recording.ips():
+            parser.error(f"{args.replay} 中没有任何 Cloudflare IP 探测结果，无法回放")
+        run(config, recording, args.out or "replay_out")
+    else:
+        if args.record:
+            probe_record.start_recording(args.record)
+        try:
+            run(config, out_dir=args.out or ".")
+        finally:
+            probe_record.stop_recording()
+    print("\n✅ 全部任务完成")
+
+
+if __name__ == "__main__":
+    main()
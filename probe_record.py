@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+探测结果录制 / 回放
+
+录制：每次探测追加一行到录制文件（.gz 结尾则 gzip 压缩），制表符分隔：
+    R  开始时间戳（每次运行一行）
+    P  IP  目标  状态  colo  connect_ms  ttfb_ms  total_ms
+    C  CIDR
+目标与 pipeline.py 一致：http / geo:<host> / trace / checkproxy:<国家>；
+状态：ok / timeout / fail / nocolo。缺失字段留空。
+被中断的运行可能在文件末尾留下不完整的数据，load() 会保留之前已完整写入的部分。
+
+开启方式：
+- pipeline.py --record probes.tsv.gz
+- 单独运行脚本时设置环境变量 PROBE_RECORD=probes.tsv.gz
+
+回放：load() 读回录制文件，pipeline.py --replay 用它代替网络探测。
+"""
+
+import atexit
+import gzip
+import os
+import subprocess
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+# curl -w 输出的阶段耗时（秒）：建连 / 首字节 / 总耗时
+CURL_TIMINGS = "%{time_connect} %{time_starttransfer} %{time_total}"
+CURL_TIMEOUT_CODE = 28
+
+ProbeEvent = namedtuple("ProbeEvent", "ip target status colo connect ttfb total")
+
+_lock = threading.Lock()
+_file = None
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _repair(path):
+    """上次运行被中断导致 gzip 文件截断时，用能读出的内容重写，否则新追加的运行也读不回来"""
+    if not path.endswith(".gz") or not os.path.exists(path):
+        return
+    lines, complete = _read_lines(path)
+    if complete:
+        return
+    with _open(path, "w") as f:
+        f.writelines(lines)
+
+
+def start_recording(path):
+    """开始录制（追加写入），每次运行先写一行 R"""
+    global _file
+    stop_recording()
+    _repair(path)
+    with _lock:
+        _file = _open(path, "a")
+        _file.write(f"R\t{int(time.time())}\n")
+
+
+def stop_recording():
+    global _file
+    with _lock:
+        if _file is not None:
+            _file.close()
+            _file = None
+
+
+def recording():
+    return _file is not None
+
+
+def _fmt(value):
+    return "" if value is None else str(value)
+
+
+def record(ip, target, status, colo=None, timings=(None, None, None)):
+    """记录一次探测；未开启录制时什么也不做"""
+    if _file is None:
+        return
+    line = "\t".join(["P", ip, target, status, _fmt(colo)] + [_fmt(t) for t in timings])
+    with _lock:
+        if _file is not None:
+            _file.write(line + "\n")
+
+
+def proxy_target(country):
+    return f"checkproxy:{country.upper()}"
+
+
+def record_cidrs(cidrs):
+    """记录本次使用的 CIDR 列表，回放时按它分段抽样"""
+    if _file is None:
+        return
+    with _lock:
+        if _file is not None:
+            _file.writelines(f"C\t{cidr}\n" for cidr in cidrs)
+
+
+def parse_curl_timings(stdout):
+    """解析 CURL_TIMINGS 输出 → (connect, ttfb, total)，单位 ms"""
+    return tuple(round(float(t) * 1000, 2) for t in stdout.split())
+
+
+def curl_status(returncode):
+    if returncode == 0:
+        return "ok"
+    if returncode == CURL_TIMEOUT_CODE:
+        return "timeout"
+    return "fail"
+
+
+def run_curl(cmd, ip, target, timeout):
+    """运行带 CURL_TIMINGS 的 curl 并录制；成功返回 (connect, ttfb, total)，否则 None"""
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        if result.returncode == 0:
+            timings = parse_curl_timings(result.stdout)
+            record(ip, target, "ok", timings=timings)
+            return timings
+        record(ip, target, curl_status(result.returncode))
+    except subprocess.TimeoutExpired:
+        record(ip, target, "timeout")
+    except Exception:
+        record(ip, target, "fail")
+    return None
+
+
+def event_latency(event):
+    """回放用：成功的探测取总耗时，其余视为超时"""
+    if event.status != "ok" or event.total is None:
+        return float("inf")
+    return event.total
+
+
+class Recording:
+    """读回的录制内容；同一 (目标, IP) 多次录制时以最后一次为准"""
+
+    def __init__(self):
+        self.cidrs = []
+        self.probes = {}
+        # 每次运行各目标的事件（按录制顺序）
+        self.runs = []
+
+    def events(self, target):
+        return self.probes.get(target, {})
+
+    def last_run_events(self, target):
+        """最近一次录到该目标的运行中，该目标的事件（保持录制顺序）"""
+        for run in reversed(self.runs):
+            if target in run:
+                return run[target]
+        return []
+
+    def ips(self):
+        """录制过的 Cloudflare IP（不含反代检测的 IP）"""
+        seen = set()
+        for target, events in self.probes.items():
+            if not target.startswith("checkproxy"):
+                seen.update(events)
+        return seen
+
+
+def _num(value):
+    return float(value) if value else None
+
+
+def _read_lines(path):
+    """读出所有完整的行；返回 (行列表, 文件是否完整)"""
+    lines = []
+    try:
+        with _open(path, "r") as f:
+            for line in f:
+                lines.append(line)
+    except (EOFError, gzip.BadGzipFile, zlib.error):
+        complete = False
+    else:
+        complete = True
+    if lines and not lines[-1].endswith("\n"):
+        lines.pop()
+        complete = False
+    return lines, complete
+
+
+def load(path):
+    rec = Recording()
+    cidrs = set()
+    lines, complete = _read_lines(path)
+    if not complete:
+        print(f"⚠️ 录制文件 {path} 末尾不完整，已忽略截断部分")
+    run = None
+    for line in lines:
+        parts = line.rstrip("\n").split("\t")
+        if parts[0] == "R":
+            run = {}
+            rec.runs.append(run)
+        elif parts[0] == "C" and len(parts) >= 2:
+            if parts[1] not in cidrs:
+                cidrs.add(parts[1])
+                rec.cidrs.append(parts[1])
+        elif parts[0] == "P" and len(parts) >= 8:
+            ip, target, status, colo = parts[1:5]
+            try:
+                event = ProbeEvent(ip, target, status, colo or None, *map(_num, parts[5:8]))
+            except ValueError:
+                continue
+            rec.probes.setdefault(target, {})[ip] = event
+            if run is None:
+                run = {}
+                rec.runs.append(run)
+            run.setdefault(target, []).append(event)
+    return rec
+
+
+if os.environ.get("PROBE_RECORD"):
+    start_recording(os.environ["PROBE_RECORD"])
+    atexit.register(stop_recording)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+探测结果列式存储 + 加权综合评分 + 按区域取前 N
+
+ProbeTable 把探测结果存成 NumPy 列（uint32 IP、float 延迟列、标志位），
+add_many() 整批写入（IP 一次性转换、每列一次切片赋值），
+score() 一次向量化计算所有行的加权分数（越低越好），
+top_n() / top_n_by_region() 用 argpartition 取前 N，不再逐条 sort 元组。
+"""
+
+import ipaddress
+import socket
+
+import numpy as np
+
+# ==================== 配置 ====================
+# 各信号权重（分数越低越好）
+#   latency    延迟 ms
+#   connect    TCP 建连耗时 ms
+#   ttfb       首字节耗时 ms
+#   jitter     抖动 ms
+#   loss       丢包率 0~1
+#   colo_miss  colo 不匹配时的惩罚
+#   history    历史平均延迟 ms
+#   throughput 吞吐 KB/s（越大越好，所以权重一般取负）
+# 某行缺少某信号（NaN）时按该列中位数计，不会因为没测过反而排前面；
+# 信号为 inf 且权重为正时整行视为不可用；整列都没有数据的权重会被忽略并提示
+# 默认只看延迟；同分时按 IP 数值排序（原 results.sort() 按 IP 字符串排序，
+# 同分 IP 的先后以及落在前 N 边界上的同分 IP 可能与之不同）
+DEFAULT_WEIGHTS = {
+    "latency": 1.0,
+    "connect": 0.0,
+    "ttfb": 0.0,
+    "jitter": 0.0,
+    "loss": 0.0,
+    "colo_miss": 0.0,
+    "history": 0.0,
+    "throughput": 0.0,
+}
+
+FLOAT_COLUMNS = ("latency", "connect", "ttfb", "jitter", "loss", "history", "throughput")
+INITIAL_CAPACITY = 1024
+# ==============================================
+
+
+def ip_to_int(ip):
+    return int(ipaddress.IPv4Address(str(ip)))
+
+
+def ips_to_array(ips):
+    """批量 IP 字符串 → uint32 数组"""
+    packed = b"".join(map(socket.inet_aton, ips))
+    return np.frombuffer(packed, dtype=">u4").astype(np.uint32)
+
+
+def int_to_ip(value):
+    return str(ipaddress.IPv4Address(int(value)))
+
+
+class ProbeTable:
+    """探测结果列式表：每行一个 (IP, 区域) 的测量"""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        capacity = max(int(capacity), 1)
+        self.size = 0
+        self.regions = []
+        self._region_index = {}
+        self.ip = np.zeros(capacity, dtype=np.uint32)
+        self.region = np.full(capacity, -1, dtype=np.int16)
+        self.colo_match = np.ones(capacity, dtype=bool)
+        self.columns = {
+            name: np.full(capacity, np.nan, dtype=np.float64) for name in FLOAT_COLUMNS
+        }
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, need):
+        capacity = len(self.ip)
+        if need <= capacity:
+            return
+        while capacity < need:
+            capacity *= 2
+        extra = capacity - len(self.ip)
+        self.ip = np.concatenate([self.ip, np.zeros(extra, dtype=np.uint32)])
+        self.region = np.concatenate([self.region, np.full(extra, -1, dtype=np.int16)])
+        self.colo_match = np.concatenate([self.colo_match, np.ones(extra, dtype=bool)])
+        for name, col in self.columns.items():
+            self.columns[name] = np.concatenate([col, np.full(extra, np.nan)])
+
+    def region_code(self, region):
+        """区域名 → 整数编码（None 为 -1）"""
+        if region is None:
+            return -1
+        code = self._region_index.get(region)
+        if code is None:
+            code = len(self.regions)
+            self.regions.append(region)
+            self._region_index[region] = code
+        return code
+
+    def add(self, ip, latency, region=None, colo_match=True, **signals):
+        """追加一行；latency 为 inf 表示超时，其余信号见 FLOAT_COLUMNS"""
+        unknown = set(signals) - set(FLOAT_COLUMNS)
+        if unknown:
+            raise ValueError(f"未知信号: {', '.join(sorted(unknown))}")
+        self._grow(self.size + 1)
+        i = self.size
+        self.ip[i] = ip_to_int(ip)
+        self.region[i] = self.region_code(region)
+        self.colo_match[i] = bool(colo_match)
+        self.columns["latency"][i] = latency
+        for name, value in signals.items():
+            self.columns[name][i] = value
+        self.size += 1
+
+    def add_many(self, ips, latency, region=None, colo_match=True, **signals):
+        """整批追加同一区域的多行；latency / 信号为与 ips 等长的序列，colo_match 可为标量或序列"""
+        unknown = set(signals) - set(FLOAT_COLUMNS)
+        if unknown:
+            raise ValueError(f"未知信号: {', '.join(sorted(unknown))}")
+        n = len(ips)
+        if n == 0:
+            return
+        self._grow(self.size + n)
+        rows = slice(self.size, self.size + n)
+        self.ip[rows] = ips_to_array(ips)
+        self.region[rows] = self.region_code(region)
+        self.colo_match[rows] = colo_match
+        self.columns["latency"][rows] = latency
+        for name, values in signals.items():
+            self.columns[name][rows] = values
+        self.size += n
+
+    def column(self, name):
+        return self.columns[name][:self.size]
+
+    def ip_str(self, index):
+        return int_to_ip(self.ip[index])
+
+
+def score(table, weights=None):
+    """向量化计算每行分数；延迟非有限（超时）的行分数为 inf"""
+    w = dict(DEFAULT_WEIGHTS)
+    if weights:
+        unknown = set(weights) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"未知权重: {', '.join(sorted(unknown))}")
+        w.update(weights)
+
+    n = table.size
+    latency = table.column("latency")
+    total = np.zeros(n, dtype=np.float64)
+    for name in FLOAT_COLUMNS:
+        if not w[name]:
+            continue
+        values = table.column(name)
+        finite = values[np.isfinite(values)]
+        if finite.size == 0:
+            if n and name != "latency":
+                print(f"⚠️ 权重 {name} 对应的信号没有数据，已忽略")
+            continue
+        # 缺失按中位数计；负权重（越大越好）的 inf 按最大有限值计，避免变成 -inf
+        values = np.where(np.isnan(values), np.median(finite), values)
+        if w[name] < 0:
+            values = np.where(np.isposinf(values), finite.max(), values)
+        total += w[name] * values
+    if w["colo_miss"]:
+        total += w["colo_miss"] * ~table.colo_match[:n]
+    total[~np.isfinite(latency)] = np.inf
+    return total
+
+
+def _top_indices(scores, ips, candidates, n):
+    """在候选行中取分数最低的 n 行，按 (分数, IP) 排好序"""
+    candidates = candidates[np.isfinite(scores[candidates])]
+    k = min(n, len(candidates))
+    if k <= 0:
+        return candidates[:0]
+    if k < len(candidates):
+        part = np.argpartition(scores[candidates], k - 1)[:k]
+        candidates = candidates[part]
+    order = np.lexsort((ips[candidates], scores[candidates]))
+    return candidates[order]
+
+
+def _as_pairs(table, indices):
+    latency = table.column("latency")
+    return [(float(latency[i]), table.ip_str(i)) for i in indices]
+
+
+def top_n(table, n, weights=None, region=None):
+    """取前 n 个，返回 [(延迟ms, IP), ...]；指定 region 时只在该区域内选"""
+    scores = score(table, weights)
+    rows = np.arange(table.size)
+    if region is not None:
+        if region not in table._region_index:
+            return []
+        rows = rows[table.region[:table.size] == table._region_index[region]]
+    return _as_pairs(table, _top_indices(scores, table.ip[:table.size], rows, n))
+
+
+def top_n_by_region(table, n, weights=None):
+    """每个区域各取前 n 个，返回 {区域: [(延迟ms, IP), ...]}"""
+    scores = score(table, weights)
+    codes = table.region[:table.size]
+    ips = table.ip[:table.size]
+    best = {}
+    for code, region in enumerate(table.regions):
+        rows = np.flatnonzero(codes == code)
+        best[region] = _as_pairs(table, _top_indices(scores, ips, rows, n))
+    return best
@@ -0,0 +1,219 @@
+import ipaddress
+import random
+
+import pytest
+
+import pipeline
+import probe_record
+
+
+def test_default_config_is_valid():
+    pipeline.validate_config(pipeline.PIPELINE)
+
+
+def test_region_jobs_sharing_outputs_are_rejected():
+    cfg = pipeline.merge_config(pipeline.PIPELINE, {"jobs": {"regions_geo": {"enabled": True}}})
+    with pytest.raises(ValueError):
+        pipeline.validate_config(cfg)
+
+
+def test_region_jobs_sharing_dynv6_hostname_are_rejected():
+    cfg = pipeline.merge_config(pipeline.PIPELINE, {
+        "jobs": {"regions_geo": {"enabled": True, "output": "geo_{region}.txt"}},
+    })
+    with pytest.raises(ValueError):
+        pipeline.validate_config(cfg)
+
+
+def test_merge_config_replaces_regions_and_dynv6():
+    cfg = pipeline.merge_config(pipeline.PIPELINE, {
+        "jobs": {"regions_trace": {"regions": {"SG": ["SIN"]}, "dynv6": {}}},
+    })
+    job = cfg["jobs"]["regions_trace"]
+    assert job["regions"] == {"SG": ["SIN"]}
+    assert job["dynv6"] == {}
+    assert job["top_n"] == pipeline.PIPELINE["jobs"]["regions_trace"]["top_n"]
+    assert set(pipeline.PIPELINE["jobs"]["regions_trace"]["regions"]) == {"SG", "JP", "US"}
+
+
+def replay(tmp_path, rec_path, name, config=None):
+    cfg = pipeline.merge_config(pipeline.PIPELINE, {"seed": 7, **(config or {})})
+    out = tmp_path / name
+    pipeline.run(cfg, probe_record.load(str(rec_path)), str(out))
+    return {p.name: p.read_text() for p in out.iterdir()}
+
+
+def make_recording(path, with_cidrs=True):
+    rng = random.Random(0)
+    probe_record.start_recording(str(path))
+    try:
+        if with_cidrs:
+            probe_record.record_cidrs(["104.16.0.0/13", "173.245.48.0/20"])
+        for cidr in ["104.16.0.0/13", "173.245.48.0/20"]:
+            for ip in pipeline.sample_cidr(cidr, 300, rng):
+                probe_record.record(ip, "http", "ok", timings=(1.0, 2.0, rng.uniform(5, 300)))
+                colo = rng.choice(["SIN", "LAX", "NRT", "FRA"])
+                probe_record.record(ip, "trace", "ok", colo, timings=(None, None, rng.uniform(5, 300)))
+        probe_record.record("9.9.9.1", probe_record.proxy_target("SG"), "ok")
+        probe_record.record("9.9.9.2", probe_record.proxy_target("US"), "fail")
+        probe_record.record("9.9.9.3", probe_record.proxy_target("US"), "ok")
+    finally:
+        probe_record.stop_recording()
+
+
+def test_replay_is_deterministic_with_seed(tmp_path):
+    rec = tmp_path / "rec.tsv.gz"
+    make_recording(rec)
+    first = replay(tmp_path, rec, "a")
+    second = replay(tmp_path, rec, "b")
+    assert first == second
+    assert set(first) == {"yxip.txt", "SG.txt", "JP.txt", "US.txt"}
+    assert all(text.strip() for text in first.values())
+
+
+def test_replay_proxy_uses_configured_country(tmp_path):
+    rec = tmp_path / "rec.tsv"
+    make_recording(rec)
+    cfg = pipeline.merge_config(pipeline.PIPELINE, {"seed": 1})
+    ctx = pipeline.run(cfg, probe_record.load(str(rec)), str(tmp_path / "out"))
+    assert ctx["proxy_ip"] == "9.9.9.3"
+
+
+def test_replay_without_cidrs_groups_by_16(tmp_path):
+    rec = tmp_path / "rec.tsv"
+    make_recording(rec, with_cidrs=False)
+    out = replay(tmp_path, rec, "out")
+    assert all(text.strip() for text in out.values())
+
+
+def test_replay_trace_only_recording_with_default_config(tmp_path):
+    # youxuan.py 单独录制的文件：只有 trace，没有 http / CIDR
+    rec = tmp_path / "rec.tsv"
+    probe_record.start_recording(str(rec))
+    try:
+        for i in range(200):
+            ip = "104.16.%d.%d" % (i // 200, i % 200 + 1)
+            probe_record.record(ip, "trace", "ok", ["SIN", "LAX", "NRT"][i % 3], timings=(None, None, float(i)))
+    finally:
+        probe_record.stop_recording()
+    cfg = pipeline.merge_config(pipeline.PIPELINE, {"seed": 1})
+    ctx = pipeline.run(cfg, probe_record.load(str(rec)), str(tmp_path / "out"))
+    for region in ("SG", "US", "JP"):
+        assert len(ctx["ranked"]["regions_trace"][region]) == 30
+    # 没有 http 探测，yxip 不写空文件
+    assert {p.name for p in (tmp_path / "out").iterdir()} == {"SG.txt", "US.txt", "JP.txt"}
+
+
+def test_replay_phase_weights_change_ranking(tmp_path):
+    rec = tmp_path / "rec.tsv"
+    probe_record.start_recording(str(rec))
+    try:
+        probe_record.record_cidrs(["104.16.0.0/24"])
+        for i in range(1, 41):
+            # 总耗时越小的 IP 建连越慢
+            probe_record.record("104.16.0.%d" % i, "http", "ok", timings=(float(100 - i), 1.0, float(i)))
+    finally:
+        probe_record.stop_recording()
+    base = {"seed": 1, "jobs": {"regions_trace": {"enabled": False}}, "proxy": {"enabled": False}}
+    by_latency = pipeline.run(pipeline.merge_config(pipeline.PIPELINE, base),
+                              probe_record.load(str(rec)), str(tmp_path / "a"))
+    base["jobs"]["yxip"] = {"weights": {"latency": 0.0, "connect": 1.0}}
+    by_connect = pipeline.run(pipeline.merge_config(pipeline.PIPELINE, base),
+                              probe_record.load(str(rec)), str(tmp_path / "b"))
+    assert by_latency["ranked"]["yxip"][0][1] == "104.16.0.1"
+    assert by_connect["ranked"]["yxip"][0][1] == "104.16.0.40"
+
+
+def test_sample_recorded_uses_cidr_range():
+    recorded = sorted(int(ipaddress.IPv4Address(ip)) for ip in ["1.0.0.1", "1.0.0.2", "1.0.1.1", "2.0.0.1"])
+    sampled = pipeline.sample_recorded("1.0.0.0/24", 5, random.Random(0), recorded)
+    assert sorted(sampled) == ["1.0.0.1", "1.0.0.2"]
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+def fake_get(url, *args, **kwargs):
+    if url == pipeline.PIPELINE["cidr_url"]:
+        return FakeResponse("104.16.0.0/20\n173.245.48.0/20\n")
+    if url == pipeline.PIPELINE["proxy"]["alive_url"]:
+        return FakeResponse("9.9.9.1,443,SG\n9.9.9.2,443,US\n")
+    if url.startswith(pipeline.PIPELINE["proxy"]["check_api"]):
+        return FakeResponse("success")
+    return FakeResponse("1.2.3.4 5.6.7.8")
+
+
+@pytest.fixture
+def live(monkeypatch):
+    """模拟网络：统计抽样和探测次数"""
+    calls = {"sample": [], "probe": []}
+    sample_cidr = pipeline.sample_cidr
+
+    def counting_sample(cidr, count, rng):
+        calls["sample"].append(cidr)
+        return sample_cidr(cidr, count, rng)
+
+    def fake_probe(target, ip):
+        calls["probe"].append((target, ip))
+        last = int(ip.rsplit(".", 1)[1])
+        if target == "http":
+            return pipeline.MISSING if last % 5 == 0 else pipeline.from_timings((1.0, 2.0, float(last)))
+        if target == "trace":
+            return pipeline.from_timings((None, None, float(last)), ["SIN", "LAX", "NRT"][last % 3])
+        return pipeline.from_timings((1.0, 2.0, float(last)))
+
+    monkeypatch.setattr(pipeline.requests, "get", fake_get)
+    monkeypatch.setattr(pipeline, "sample_cidr", counting_sample)
+    monkeypatch.setattr(pipeline, "run_probe", fake_probe)
+    return calls
+
+
+def test_live_run_shares_sampling_and_probes(tmp_path, live):
+    cfg = pipeline.merge_config(pipeline.PIPELINE, {"seed": 1})
+    ctx = pipeline.run(cfg, out_dir=str(tmp_path))
+
+    # 每个 CIDR 只抽样一次
+    assert sorted(live["sample"]) == ["104.16.0.0/20", "173.245.48.0/20"]
+    # 每个 (目标, IP) 只探测一次，trace 只跑预筛存活的 IP
+    assert len(live["probe"]) == len(set(live["probe"]))
+    assert {t for t, _ in live["probe"]} == {"http", "trace"}
+    http_ips = {ip for t, ip in live["probe"] if t == "http"}
+    trace_ips = {ip for t, ip in live["probe"] if t == "trace"}
+    assert http_ips == set(ctx["pool"])
+    assert trace_ips == ctx["alive"]
+
+    files = {p.name: p.read_text().split() for p in tmp_path.iterdir()}
+    assert set(files) == {"ip.txt", "yxip.txt", "SG.txt", "US.txt", "JP.txt"}
+    assert files["ip.txt"] == ["1.2.3.4", "5.6.7.8"]
+    assert len(files["yxip.txt"]) == cfg["jobs"]["yxip"]["top_n"]
+    # 一次 trace 同时归到所有区域
+    for region in ("SG", "US", "JP"):
+        assert len(files[f"{region}.txt"]) == cfg["jobs"]["regions_trace"]["top_n"]
+    assert ctx["proxy_ip"] == "9.9.9.2"
+
+
+def test_live_geo_job_probes_shared_host_once(tmp_path, live):
+    cfg = pipeline.merge_config(pipeline.PIPELINE, {
+        "seed": 1,
+        "sources": {"enabled": False},
+        "proxy": {"enabled": False},
+        "jobs": {
+            "yxip": {"enabled": False},
+            "regions_trace": {"enabled": False},
+            "regions_geo": {"enabled": True, "dynv6": {}},
+        },
+    })
+    pipeline.run(cfg, out_dir=str(tmp_path))
+
+    geo_targets = {t for t, _ in live["probe"] if t.startswith("geo:")}
+    # HK 和 JP 共用测速节点，只测一次
+    assert len(geo_targets) == 3
+    assert len(live["probe"]) == len(set(live["probe"]))
+    assert {p.name for p in tmp_path.iterdir()} == {"SG.txt", "US.txt", "HK.txt", "JP.txt"}
+    assert (tmp_path / "HK.txt").read_text() == (tmp_path / "JP.txt").read_text()
@@ -0,0 +1,62 @@
+import gzip
+
+import probe_record
+
+
+def write_recording(path, runs):
+    """runs: [[(ip, target, status, colo, total), ...], ...]，每个元素一次运行"""
+    for events in runs:
+        probe_record.start_recording(str(path))
+        try:
+            probe_record.record_cidrs(["104.16.0.0/13"])
+            for ip, target, status, colo, total in events:
+                probe_record.record(ip, target, status, colo, timings=(1.0, 2.0, total))
+        finally:
+            probe_record.stop_recording()
+
+
+def test_load_round_trip(tmp_path):
+    path = tmp_path / "rec.tsv.gz"
+    write_recording(path, [[
+        ("104.16.0.1", "http", "ok", None, 12.5),
+        ("104.16.0.2", "trace", "ok", "SIN", 30.0),
+        ("104.16.0.3", "http", "timeout", None, None),
+    ]])
+    rec = probe_record.load(str(path))
+    assert rec.cidrs == ["104.16.0.0/13"]
+    event = rec.events("http")["104.16.0.1"]
+    assert (event.status, event.connect, event.ttfb, event.total) == ("ok", 1.0, 2.0, 12.5)
+    assert rec.events("trace")["104.16.0.2"].colo == "SIN"
+    assert probe_record.event_latency(rec.events("http")["104.16.0.3"]) == float("inf")
+    assert rec.ips() == {"104.16.0.1", "104.16.0.2", "104.16.0.3"}
+
+
+def test_last_run_keeps_recording_order(tmp_path):
+    path = tmp_path / "rec.tsv"
+    us = probe_record.proxy_target("us")
+    write_recording(path, [
+        [("1.1.1.1", us, "fail", None, 5.0), ("2.2.2.2", us, "ok", None, 5.0)],
+        [("3.3.3.3", us, "fail", None, 5.0), ("1.1.1.1", us, "ok", None, 5.0)],
+    ])
+    rec = probe_record.load(str(path))
+    assert [e.ip for e in rec.last_run_events(us)] == ["3.3.3.3", "1.1.1.1"]
+    assert "1.1.1.1" not in rec.ips()
+
+
+def test_truncated_gzip_keeps_earlier_runs(tmp_path):
+    path = tmp_path / "rec.tsv.gz"
+    write_recording(path, [[("104.16.0.1", "http", "ok", None, 10.0)]])
+    intact = path.read_bytes()
+    write_recording(path, [[("104.16.0.%d" % i, "http", "ok", None, 10.0) for i in range(2, 200)]])
+    data = path.read_bytes()
+    path.write_bytes(data[:len(intact) + (len(data) - len(intact)) // 2])
+
+    rec = probe_record.load(str(path))
+    assert "104.16.0.1" in rec.events("http")
+
+    # 截断后继续追加的运行也能读回来
+    write_recording(path, [[("104.17.0.1", "http", "ok", None, 10.0)]])
+    rec = probe_record.load(str(path))
+    assert {"104.16.0.1", "104.17.0.1"} <= set(rec.events("http"))
+    with gzip.open(path, "rt") as f:
+        f.read()
@@ -0,0 +1,105 @@
+import math
+
+import pytest
+
+from scoring import ProbeTable, score, top_n, top_n_by_region
+
+
+def make_table():
+    table = ProbeTable(2)
+    table.add("1.1.1.10", 20.0, region="SG")
+    table.add("1.1.1.9", 20.0, region="SG")
+    table.add("1.1.1.1", 5.0, region="SG", jitter=100.0)
+    table.add("1.1.1.2", math.inf, region="SG")
+    table.add("2.2.2.2", 8.0, region="US", colo_match=False)
+    table.add("2.2.2.3", 9.0, region="US")
+    return table
+
+
+def test_score_default_is_latency_and_timeout_is_inf():
+    table = make_table()
+    s = score(table)
+    assert list(s[:3]) == [20.0, 20.0, 5.0]
+    assert math.isinf(s[3])
+
+
+def test_score_weights_and_missing_signals(capsys):
+    table = make_table()
+    s = score(table, {"jitter": 1.0, "colo_miss": 100.0, "history": 1.0})
+    # 缺 jitter 的行按中位数（100）计；history 整列为空，忽略并提示
+    assert s[2] == 105.0
+    assert s[4] == 208.0
+    assert s[5] == 109.0
+    assert math.isinf(s[3])
+    assert "history" in capsys.readouterr().out
+
+
+def test_missing_signal_does_not_win():
+    table = ProbeTable()
+    table.add("1.1.1.1", 10.0, jitter=5.0)
+    table.add("1.1.1.2", 10.0, jitter=50.0)
+    table.add("1.1.1.3", 10.0)
+    assert [ip for _, ip in top_n(table, 3, {"jitter": 1.0})] == ["1.1.1.1", "1.1.1.3", "1.1.1.2"]
+
+
+def test_infinite_penalty_signal_is_not_perfect():
+    table = ProbeTable()
+    table.add("1.1.1.1", 10.0, jitter=math.inf)
+    table.add("1.1.1.2", 50.0, jitter=5.0)
+    assert top_n(table, 2, {"jitter": 1.0}) == [(50.0, "1.1.1.2")]
+
+
+def test_negative_weight_with_infinite_signal_stays_finite():
+    table = ProbeTable()
+    table.add("1.1.1.1", 10.0, throughput=math.inf)
+    table.add("1.1.1.2", 10.0, throughput=100.0)
+    s = score(table, {"throughput": -1.0})
+    assert list(s) == [-90.0, -90.0]
+
+
+def test_add_many_matches_add():
+    ips = ["1.1.1.10", "1.1.1.9", "8.8.8.8"]
+    lat = [20.0, 20.0, math.inf]
+    one = ProbeTable(1)
+    for ip, value in zip(ips, lat):
+        one.add(ip, value, region="SG", jitter=1.0)
+    many = ProbeTable(1)
+    many.add_many(ips, lat, region="SG", jitter=[1.0, 1.0, 1.0])
+    assert list(one.ip[:3]) == list(many.ip[:3])
+    assert top_n_by_region(one, 5) == top_n_by_region(many, 5)
+    many.add_many([], [])
+    assert len(many) == 3
+
+
+def test_score_rejects_unknown_weight():
+    with pytest.raises(ValueError):
+        score(make_table(), {"bogus": 1.0})
+
+
+def test_add_rejects_unknown_signal():
+    with pytest.raises(ValueError):
+        ProbeTable().add("1.1.1.1", 1.0, bogus=1.0)
+
+
+def test_top_n_by_region_orders_and_breaks_ties_numerically():
+    best = top_n_by_region(make_table(), 3)
+    assert best["SG"] == [(5.0, "1.1.1.1"), (20.0, "1.1.1.9"), (20.0, "1.1.1.10")]
+    assert best["US"] == [(8.0, "2.2.2.2"), (9.0, "2.2.2.3")]
+
+
+def test_top_n_by_region_applies_weights():
+    best = top_n_by_region(make_table(), 1, {"colo_miss": 100.0})
+    assert best["US"] == [(9.0, "2.2.2.3")]
+
+
+def test_top_n_region_filter_and_unknown_region():
+    table = make_table()
+    assert top_n(table, 2) == [(5.0, "1.1.1.1"), (8.0, "2.2.2.2")]
+    assert top_n(table, 5, region="US") == [(8.0, "2.2.2.2"), (9.0, "2.2.2.3")]
+    assert top_n(table, 5, region="JP") == []
+
+
+def test_top_n_excludes_timeouts():
+    table = ProbeTable()
+    table.add("1.1.1.1", math.inf)
+    assert top_n(table, 5) == []
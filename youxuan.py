@@ -11,8 +11,11 @@ import requests
 import ipaddress
 import random
 import subprocess
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from probe_record import proxy_target, record, record_cidrs
+
 # ================= 配置 =================
 IPV4_URL = "https://www.cloudflare.com/ips-v4"
 IPS_PER_CIDR = 200
@@ -60,7 +63,9 @@ def dynv6_update(hostname, token, ip):
 def get_cf_cidrs():
     r = requests.get(IPV4_URL, timeout=10)
     r.raise_for_status()
-    return [i.strip() for i in r.text.splitlines() if i.strip()]
+    cidrs = [i.strip() for i in r.text.splitlines() if i.strip()]
+    record_cidrs(cidrs)
+    return cidrs
 
 
 def expand_cidr(cidr):
@@ -70,18 +75,27 @@ def expand_cidr(cidr):
 
 
 def trace_ip(ip):
+    start = time.perf_counter()
+    status = "fail"
     try:
         r = requests.get(
             f"http://{ip}/cdn-cgi/trace",
             timeout=TRACE_TIMEOUT,
             headers={"Host": "www.cloudflare.com"},
         )
+        status = "nocolo"
         if "colo=" in r.text:
             for line in r.text.splitlines():
                 if line.startswith("colo="):
-                    return ip, line.split("=")[1]
+                    colo = line.split("=")[1]
+                    elapsed = round((time.perf_counter() - start) * 1000, 2)
+                    record(ip, "trace", "ok", colo, timings=(None, None, elapsed))
+                    return ip, colo
+    except requests.Timeout:
+        status = "timeout"
     except:
         pass
+    record(ip, "trace", status)
     return ip, None
 
 
@@ -134,13 +148,17 @@ def update_proxy_from_alive():
         if port != "443" or cc != "US":
             continue
 
+        start = time.perf_counter()
         try:
             chk = requests.get(CHECK_PROXY_API + ip, timeout=6).text
+            elapsed = round((time.perf_counter() - start) * 1000, 2)
+            record(ip, proxy_target(cc), "ok" if "success" in chk else "fail", timings=(None, None, elapsed))
             if "success" in chk:
                 dynv6_update(PROXY_HOSTNAME, PROXY_TOKEN, ip)
                 print("🏁 proxyipmy 完成")
                 return
-        except:
+        except Exception as e:
+            record(ip, proxy_target(cc), "timeout" if isinstance(e, requests.Timeout) else "fail")
             continue
 
     print("❌ alive.txt 中未找到可用 US 反代 IP")